@@ -0,0 +1,102 @@
+"""
+Bulk load helpers shared by the PostgreSQL migration and transfer scripts
+"""
+
+import io
+import json
+import queue
+import threading
+
+import psycopg2
+
+QUEUE_DEPTH = 4  # Batches buffered between the fetch thread and the loader
+
+# Session settings for the one-shot bulk load: commits return before the WAL
+# flush, and index rebuilds/sorts get more memory. A CHECKPOINT at the end
+# makes everything durable.
+SESSION_TUNING = """
+    SET synchronous_commit TO off;
+    SET maintenance_work_mem = '1GB';
+    SET work_mem = '256MB';
+"""
+
+# Characters that must be backslash-escaped in COPY text format
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Deletes null bytes, which PostgreSQL text columns reject
+NULL_BYTE_TRANS = str.maketrans('', '', '\x00')
+
+def format_copy_value(value):
+    """Render a single value in PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (bytes, memoryview)):
+        return '\\\\x' + bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).translate(COPY_ESCAPES)
+
+def copy_rows(cursor, copy_statement, rows, formatters=None):
+    """Bulk load rows into a table through COPY FROM STDIN.
+    
+    formatters optionally gives a per-column replacement for
+    format_copy_value.
+    """
+    buf = io.StringIO()
+    for row in rows:
+        if formatters is None:
+            buf.write('\t'.join(format_copy_value(value) for value in row))
+        else:
+            buf.write('\t'.join(format_value(value) for format_value, value in zip(formatters, row)))
+        buf.write('\n')
+    buf.seek(0)
+    cursor.copy_expert(copy_statement, buf)
+
+def run_checkpoint(conn, cursor, log=print):
+    """Flush everything written with synchronous_commit off"""
+    try:
+        cursor.execute("CHECKPOINT")
+    except psycopg2.Error as e:
+        log(f"⚠️  Could not run CHECKPOINT: {e}")
+        conn.rollback()
+
+def iter_batches_in_background(fetch_batch, convert_row):
+    """Yield converted batches fetched on a background thread.
+    
+    The bounded queue lets the source fetch the next batch while the
+    current one is being loaded into PostgreSQL.
+    """
+    batch_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+    
+    def produce():
+        try:
+            while not stop.is_set():
+                rows = fetch_batch()
+                if not rows:
+                    break
+                batch_queue.put([convert_row(row) for row in rows])
+        except Exception as e:
+            batch_queue.put(e)
+        batch_queue.put(None)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batch_queue.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        # Unblock the producer if the consumer stopped early
+        stop.set()
+        while producer.is_alive():
+            try:
+                batch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
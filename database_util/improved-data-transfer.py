@@ -4,8 +4,17 @@ Improved Data Transfer Script with Type Conversion
 """
 
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values, Json
 import sys
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bulk_load import (
+    COPY_ESCAPES, NULL_BYTE_TRANS, SESSION_TUNING,
+    copy_rows, format_copy_value, iter_batches_in_background, run_checkpoint
+)
 
 # Configuration
 PG_CONFIG = {
@@ -17,6 +26,24 @@ PG_CONFIG = {
 
 SOURCE_DB = 'openwebui_db'
 TARGET_DB = 'openwebui_clean'
+PAGE_SIZE = 1000  # Rows per multi-row INSERT statement
+BATCH_SIZE = 5000  # Rows fetched from the source and loaded per COPY
+MAX_WORKERS = 8  # Tables transferred in parallel, each on its own connections
+MAX_CONCURRENT_LOADS = 4  # COPYs/index rebuilds allowed to run on the target at once
+
+# Shared by all table workers; held only while writing to the target, so
+# other workers keep fetching and converting their next batch meanwhile
+LOAD_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_LOADS)
+
+# postgres_fdw objects created in the target to read the source database server-side
+FDW_SERVER = 'transfer_source_server'
+FDW_SCHEMA = 'transfer_source'
+
+# Backslash-escapes for a quoted element of an array literal
+ARRAY_ELEMENT_ESCAPES = str.maketrans({'\\': '\\\\', '"': '\\"'})
+
+# Target column types whose dict/list values are JSON documents
+JSON_TYPES = ('json', 'jsonb')
 
 # Type conversion mappings for problematic columns
 BOOLEAN_COLUMNS = {
@@ -26,24 +53,466 @@ BOOLEAN_COLUMNS = {
     'user': ['role', 'active']  # These might be booleans in new schema
 }
 
-def convert_value(table_name, column_name, value, target_type):
-    """Convert values based on target type"""
-    if target_type == 'boolean':
-        if isinstance(value, int):
-            return bool(value)
-        elif isinstance(value, str):
-            return value.lower() in ('true', '1', 'yes', 't')
+def _to_bool(value):
+    """Convert a value for a boolean column"""
+    if isinstance(value, int):
         return bool(value)
-    elif target_type in ['integer', 'bigint']:
-        if value is None:
-            return None
-        return int(value) if str(value).isdigit() else None
-    elif target_type.startswith('character varying') or target_type == 'text':
-        if value is None:
-            return None
-        return str(value).replace('\x00', '')
+    elif isinstance(value, str):
+        return value.lower() in ('true', '1', 'yes', 't')
+    return bool(value)
+
+def _to_int(value):
+    """Convert a value for an integer column, returning None if it isn't a whole number"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def _to_text(value):
+    """Convert a value for a text column, stripping null bytes"""
+    if value is None:
+        return None
+    return str(value).translate(NULL_BYTE_TRANS)
+
+def _identity(value):
+    """Pass a value through unchanged"""
     return value
 
+# Value converters keyed by information_schema data_type
+CONVERTERS = {
+    'boolean': _to_bool,
+    'integer': _to_int,
+    'bigint': _to_int,
+    'text': _to_text,
+    'character varying': _to_text
+}
+
+def pick_converter(target_type):
+    """Pick the value converter for a target column type"""
+    return CONVERTERS.get(target_type, _identity)
+
+def format_array_element(value):
+    """Render one element of a PostgreSQL array literal"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, list):
+        return '{' + ','.join(format_array_element(item) for item in value) + '}'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (bytes, memoryview)):
+        value = '\\x' + bytes(value).hex()
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    return '"' + str(value).translate(ARRAY_ELEMENT_ESCAPES) + '"'
+
+def format_copy_array(value):
+    """Render an array value in PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    return format_array_element(list(value)).translate(COPY_ESCAPES)
+
+def wrap_json_values(rows, json_columns):
+    """Wrap json/jsonb column values so psycopg2 sends them as JSON, not arrays"""
+    if not json_columns:
+        return rows
+    wrapped_rows = []
+    for row in rows:
+        row = list(row)
+        for i in json_columns:
+            if row[i] is not None:
+                row[i] = Json(row[i])
+        wrapped_rows.append(row)
+    return wrapped_rows
+
+def build_load_statements(table_name, columns, column_types):
+    """Compose the COPY and INSERT statements used to load a table.
+    
+    Also picks how each column's values are written: list values are
+    arrays in ARRAY columns but JSON documents in json/jsonb columns.
+    """
+    table = sql.Identifier(table_name)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    return {
+        'copy': sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT text, NULL '\\N')").format(table, column_list),
+        'copy_formatters': [
+            format_copy_array if column_type == 'ARRAY' else format_copy_value
+            for column_type in column_types
+        ],
+        'json_columns': [i for i, column_type in enumerate(column_types) if column_type in JSON_TYPES],
+        'insert_values': sql.SQL('INSERT INTO {} ({}) VALUES %s').format(table, column_list),
+        'insert_row': sql.SQL('INSERT INTO {} ({}) VALUES ({})').format(
+            table, column_list, sql.SQL(', ').join(sql.Placeholder() * len(columns))
+        )
+    }
+
+def insert_rows_individually(cursor, table_name, insert_statement, converted_rows):
+    """Insert rows one at a time so a bad row doesn't discard the rest of the table"""
+    success_count = 0
+    for converted_row in converted_rows:
+        cursor.execute("SAVEPOINT row_insert")
+        try:
+            cursor.execute(insert_statement, converted_row)
+            cursor.execute("RELEASE SAVEPOINT row_insert")
+            success_count += 1
+        except Exception as e:
+            print(f"❌ Error inserting row in {table_name}: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT row_insert")
+    return success_count
+
+def insert_rows(cursor, table_name, statements, converted_rows):
+    """Insert rows with multi-row INSERTs, falling back to row-by-row on failure"""
+    converted_rows = wrap_json_values(converted_rows, statements['json_columns'])
+    cursor.execute("SAVEPOINT batch_insert")
+    try:
+        execute_values(cursor, statements['insert_values'], converted_rows, page_size=PAGE_SIZE)
+        cursor.execute("RELEASE SAVEPOINT batch_insert")
+        return len(converted_rows)
+    except Exception as e:
+        print(f"⚠️  Batch insert failed for {table_name}, retrying row by row: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_insert")
+        return insert_rows_individually(cursor, table_name, statements['insert_row'], converted_rows)
+
+def load_batch(cursor, table_name, statements, converted_rows):
+    """Load a batch with COPY, falling back to INSERTs if any row is rejected"""
+    cursor.execute("SAVEPOINT batch_copy")
+    try:
+        copy_rows(cursor, statements['copy'], converted_rows, statements['copy_formatters'])
+        cursor.execute("RELEASE SAVEPOINT batch_copy")
+        return len(converted_rows)
+    except psycopg2.Error as e:
+        print(f"⚠️  COPY failed for {table_name}, retrying with batched INSERTs: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_copy")
+        return insert_rows(cursor, table_name, statements, converted_rows)
+
+def fetch_columns(cursor):
+    """Map each public table to its (column, data_type, is_nullable) rows in ordinal order"""
+    cursor.execute("""
+        SELECT table_name, column_name, data_type, is_nullable
+        FROM information_schema.columns 
+        WHERE table_schema = 'public'
+        ORDER BY table_name, ordinal_position
+    """)
+    columns = {}
+    for table_name, column_name, data_type, is_nullable in cursor.fetchall():
+        columns.setdefault(table_name, []).append((column_name, data_type, is_nullable))
+    return columns
+
+def fetch_secondary_indexes(cursor):
+    """Map each public table to its droppable indexes as (name, CREATE INDEX statement)"""
+    # Unique indexes and indexes backing a constraint are kept in place, so
+    # duplicate rows are still rejected one by one instead of failing the rebuild
+    cursor.execute("""
+        SELECT t.relname, i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public'
+        AND NOT x.indisunique
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+    """)
+    indexes = {}
+    for table_name, index_name, index_def in cursor.fetchall():
+        indexes.setdefault(table_name, []).append((index_name, index_def))
+    return indexes
+
+def clear_tables(conn, cursor, dependency_levels):
+    """Empty every table before any is loaded, returning False if they can't be cleared.
+    
+    A single TRUNCATE covers tables that reference each other; if tables
+    outside the transfer reference them, rows are deleted children first.
+    """
+    tables = [table_name for level in dependency_levels for table_name in level]
+    if not tables:
+        return True
+    try:
+        with conn:
+            cursor.execute("SAVEPOINT clear_tables")
+            try:
+                cursor.execute(sql.SQL('TRUNCATE TABLE {} RESTART IDENTITY').format(
+                    sql.SQL(', ').join(map(sql.Identifier, tables))
+                ))
+                cursor.execute("RELEASE SAVEPOINT clear_tables")
+            except psycopg2.Error:
+                cursor.execute("ROLLBACK TO SAVEPOINT clear_tables")
+                for level in reversed(dependency_levels):
+                    for table_name in level:
+                        cursor.execute(sql.SQL('DELETE FROM {}').format(sql.Identifier(table_name)))
+        return True
+    except psycopg2.Error as e:
+        print(f"❌ Could not clear target tables: {e}")
+        return False
+
+def sync_sequences(cursor, table_name):
+    """Move serial/identity sequences past the ids loaded from the source.
+    
+    TRUNCATE ... RESTART IDENTITY resets them to their start value, but
+    the load inserts explicit ids, so without this the next insert by the
+    application would hit a duplicate key.
+    """
+    cursor.execute("""
+        SELECT column_name, pg_get_serial_sequence(quote_ident(table_name), column_name)
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = %s
+        AND pg_get_serial_sequence(quote_ident(table_name), column_name) IS NOT NULL
+    """, (table_name,))
+    for column_name, sequence_name in cursor.fetchall():
+        cursor.execute("SAVEPOINT sync_sequence")
+        try:
+            cursor.execute(sql.SQL("SELECT setval(%s, COALESCE(MAX({col}), 1), MAX({col}) IS NOT NULL) FROM {table}").format(
+                col=sql.Identifier(column_name), table=sql.Identifier(table_name)
+            ), (sequence_name,))
+            cursor.execute("RELEASE SAVEPOINT sync_sequence")
+        except psycopg2.Error as e:
+            print(f"⚠️  Could not update sequence {sequence_name} for {table_name}: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT sync_sequence")
+
+def drop_indexes(cursor, table_name, table_indexes):
+    """Drop a table's secondary indexes, returning False if not permitted"""
+    cursor.execute("SAVEPOINT drop_indexes")
+    try:
+        for index_name, _ in table_indexes:
+            cursor.execute(sql.SQL('DROP INDEX {}').format(sql.Identifier(index_name)))
+        cursor.execute("RELEASE SAVEPOINT drop_indexes")
+        return True
+    except psycopg2.Error as e:
+        print(f"⚠️  Could not drop indexes on {table_name}, loading with indexes in place: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT drop_indexes")
+        return False
+
+def disable_triggers(cursor, table_name):
+    """Disable all triggers, including FK checks, returning False if not permitted"""
+    cursor.execute("SAVEPOINT disable_triggers")
+    try:
+        cursor.execute(sql.SQL('ALTER TABLE {} DISABLE TRIGGER ALL').format(sql.Identifier(table_name)))
+        cursor.execute("RELEASE SAVEPOINT disable_triggers")
+        return True
+    except psycopg2.Error as e:
+        print(f"⚠️  Could not disable triggers on {table_name}, loading with triggers on: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT disable_triggers")
+        return False
+
+def setup_source_fdw(conn, cursor):
+    """Import the source's public schema into the target through postgres_fdw.
+    
+    Returns False, leaving nothing behind, if the extension or server
+    can't be created (e.g. missing privileges).
+    """
+    try:
+        with conn:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS postgres_fdw")
+            cursor.execute(sql.SQL("DROP SERVER IF EXISTS {} CASCADE").format(sql.Identifier(FDW_SERVER)))
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(FDW_SCHEMA)))
+            cursor.execute(
+                sql.SQL("CREATE SERVER {} FOREIGN DATA WRAPPER postgres_fdw OPTIONS (host %s, port %s, dbname %s)")
+                .format(sql.Identifier(FDW_SERVER)),
+                (PG_CONFIG['host'], str(PG_CONFIG['port']), SOURCE_DB)
+            )
+            cursor.execute(
+                sql.SQL("CREATE USER MAPPING FOR CURRENT_USER SERVER {} OPTIONS (user %s, password %s)")
+                .format(sql.Identifier(FDW_SERVER)),
+                (PG_CONFIG['user'], PG_CONFIG['password'])
+            )
+            cursor.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(FDW_SCHEMA)))
+            cursor.execute(sql.SQL("IMPORT FOREIGN SCHEMA public FROM SERVER {} INTO {}").format(
+                sql.Identifier(FDW_SERVER), sql.Identifier(FDW_SCHEMA)
+            ))
+        return True
+    except psycopg2.Error as e:
+        print(f"⚠️  postgres_fdw unavailable, transferring all tables through the client: {e}")
+        return False
+
+def teardown_source_fdw(conn, cursor):
+    """Drop the postgres_fdw server and foreign tables created by setup_source_fdw"""
+    try:
+        conn.rollback()
+        with conn:
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(FDW_SCHEMA)))
+            cursor.execute(sql.SQL("DROP SERVER IF EXISTS {} CASCADE").format(sql.Identifier(FDW_SERVER)))
+    except psycopg2.Error as e:
+        print(f"⚠️  Could not remove postgres_fdw objects: {e}")
+
+def transfer_server_side(cursor, table_name, columns):
+    """Copy a table with INSERT ... SELECT from its foreign table, returning the row count.
+    
+    Returns None if PostgreSQL rejects the copy, so the caller can fall
+    back to the client-side transfer.
+    """
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    cursor.execute("SAVEPOINT server_side_copy")
+    try:
+        cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}.{}").format(
+            sql.Identifier(table_name), column_list, column_list,
+            sql.Identifier(FDW_SCHEMA), sql.Identifier(table_name)
+        ))
+        cursor.execute("RELEASE SAVEPOINT server_side_copy")
+        return cursor.rowcount
+    except psycopg2.Error as e:
+        print(f"⚠️  Server-side copy failed for {table_name}, transferring through the client: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT server_side_copy")
+        return None
+
+def transfer_client_side(source_conn, target_cursor, table_name, columns, column_types, convert_row):
+    """Stream a table through the client, returning (total rows, rows loaded)"""
+    statements = build_load_statements(table_name, columns, column_types)
+    fetch_cursor = source_conn.cursor(name=f'transfer_{table_name}')
+    fetch_cursor.execute(sql.SQL('SELECT {} FROM {}').format(
+        sql.SQL(', ').join(map(sql.Identifier, columns)),
+        sql.Identifier(table_name)
+    ))
+    
+    # Fetch from source on a background thread while loading into target
+    total_count = 0
+    success_count = 0
+    try:
+        for converted_rows in iter_batches_in_background(
+            lambda: fetch_cursor.fetchmany(BATCH_SIZE), convert_row
+        ):
+            total_count += len(converted_rows)
+            with LOAD_SLOTS:
+                success_count += load_batch(target_cursor, table_name, statements, converted_rows)
+    finally:
+        fetch_cursor.close()
+    return total_count, success_count
+
+def fetch_dependency_levels(cursor, tables):
+    """Group tables into levels so each table comes after the tables its foreign keys reference"""
+    cursor.execute("""
+        SELECT child.relname, parent.relname
+        FROM pg_constraint c
+        JOIN pg_class child ON child.oid = c.conrelid
+        JOIN pg_class parent ON parent.oid = c.confrelid
+        JOIN pg_namespace n ON n.oid = child.relnamespace
+        WHERE c.contype = 'f'
+        AND n.nspname = 'public'
+    """)
+    depends_on = {table: set() for table in tables}
+    for child, parent in cursor.fetchall():
+        if child in depends_on and parent in depends_on and child != parent:
+            depends_on[child].add(parent)
+    
+    levels = []
+    remaining = set(tables)
+    while remaining:
+        level = sorted(table for table in remaining if not depends_on[table] & remaining)
+        if not level:
+            # Foreign key cycle: load the remaining tables together
+            level = sorted(remaining)
+        levels.append(level)
+        remaining -= set(level)
+    return levels
+
+def find_common_columns(table_name, target_columns, source_columns_by_table):
+    """List the target table's columns that also exist in the source table"""
+    source_columns = {col for col, _, _ in source_columns_by_table.get(table_name, [])}
+    return [col for col, _, _ in target_columns.get(table_name, []) if col in source_columns]
+
+def transfer_table(table_name, target_columns, source_columns_by_table, secondary_indexes, fdw_ready):
+    """Transfer one table on its own pair of connections, returning False on failure"""
+    print(f"📋 Processing table: {table_name}")
+    
+    # Check if table exists in source, from the already-fetched metadata
+    if table_name not in source_columns_by_table:
+        print(f"⏭️  Table {table_name} doesn't exist in source, skipping")
+        return True
+    
+    # Look up target table schema with data types
+    target_schema = {
+        col: {'type': data_type, 'nullable': is_nullable}
+        for col, data_type, is_nullable in target_columns.get(table_name, [])
+    }
+    
+    # Find common columns
+    common_columns = find_common_columns(table_name, target_columns, source_columns_by_table)
+    
+    if not common_columns:
+        print(f"⚠️  No common columns found for {table_name}")
+        return True
+    
+    # psycopg2 connections can't be shared between threads, so each table gets its own
+    source_conn = None
+    target_conn = None
+    
+    try:
+        source_conn = psycopg2.connect(database=SOURCE_DB, **PG_CONFIG)
+        target_conn = psycopg2.connect(database=TARGET_DB, **PG_CONFIG)
+        target_cursor = target_conn.cursor()
+        target_cursor.execute(SESSION_TUNING)
+        target_conn.commit()
+        
+        # Load the table in a single transaction; the connection context
+        # manager commits on success and rolls back on error
+        with target_conn:
+            # Drop secondary indexes and disable triggers for the load. Both are
+            # restored before the commit, and a rollback restores them as well
+            table_indexes = secondary_indexes.get(table_name, [])
+            if table_indexes and not drop_indexes(target_cursor, table_name, table_indexes):
+                table_indexes = []
+            triggers_disabled = disable_triggers(target_cursor, table_name)
+        
+            # Convert values based on target schema, resolving converters once per table.
+            # Columns whose type is unchanged are passed through untouched: values
+            # from a PostgreSQL column are already valid for the same target type
+            # (text there cannot hold null bytes)
+            source_types = {col: data_type for col, data_type, _ in source_columns_by_table[table_name]}
+            need_convert = []
+            for i, col in enumerate(common_columns):
+                target_type = target_schema[col]['type']
+                converter = pick_converter(target_type)
+                if source_types[col] != target_type and converter is not _identity:
+                    need_convert.append((i, converter))
+        
+            def convert_row(row):
+                if not need_convert:
+                    return row
+                row_list = list(row)
+                for i, convert in need_convert:
+                    row_list[i] = convert(row_list[i])
+                return row_list
+        
+            # Tables that need no conversion are copied entirely inside PostgreSQL
+            # when the source is reachable through postgres_fdw
+            copied = None
+            if fdw_ready and not need_convert:
+                with LOAD_SLOTS:
+                    copied = transfer_server_side(target_cursor, table_name, common_columns)
+        
+            if copied is not None:
+                total_count = success_count = copied
+            else:
+                total_count, success_count = transfer_client_side(
+                    source_conn, target_cursor, table_name, common_columns,
+                    [target_schema[col]['type'] for col in common_columns], convert_row
+                )
+        
+            # Rebuild indexes in one pass over the loaded data
+            with LOAD_SLOTS:
+                for _, index_def in table_indexes:
+                    target_cursor.execute(index_def)
+            if triggers_disabled:
+                target_cursor.execute(sql.SQL('ALTER TABLE {} ENABLE TRIGGER ALL').format(sql.Identifier(table_name)))
+            sync_sequences(target_cursor, table_name)
+        
+        if total_count == 0:
+            print(f"ℹ️  Table {table_name} is empty")
+        else:
+            print(f"✅ Transferred {success_count}/{total_count} rows for table: {table_name}")
+        return success_count == total_count
+        
+    except Exception as e:
+        print(f"❌ Error processing table {table_name}: {e}")
+        return False
+    finally:
+        if source_conn is not None:
+            source_conn.close()
+        if target_conn is not None:
+            target_conn.close()
+
 def transfer_data():
     print("🔄 Starting improved data transfer with type conversion...")
     
@@ -52,6 +521,7 @@ def transfer_data():
     
     source_cursor = source_conn.cursor()
     target_cursor = target_conn.cursor()
+    fdw_ready = False
     
     try:
         # Get list of tables from target database (the clean one with proper schema)
@@ -64,88 +534,45 @@ def transfer_data():
             ORDER BY table_name
         """)
         tables_to_transfer = [row[0] for row in target_cursor.fetchall()]
+        secondary_indexes = fetch_secondary_indexes(target_cursor)
+        dependency_levels = fetch_dependency_levels(target_cursor, tables_to_transfer)
         
-        for table_name in tables_to_transfer:
-            print(f"📋 Processing table: {table_name}")
-            
-            try:
-                # Check if table exists in source
-                source_cursor.execute(f"SELECT to_regclass('public.{table_name}') IS NOT NULL")
-                table_exists = source_cursor.fetchone()[0]
-                
-                if not table_exists:
-                    print(f"⏭️  Table {table_name} doesn't exist in source, skipping")
-                    continue
-                
-                # Get target table schema with data types
-                target_cursor.execute(f"""
-                    SELECT column_name, data_type, is_nullable
-                    FROM information_schema.columns 
-                    WHERE table_name = '{table_name}' 
-                    AND table_schema = 'public'
-                    ORDER BY ordinal_position
-                """)
-                target_schema = {row[0]: {'type': row[1], 'nullable': row[2]} for row in target_cursor.fetchall()}
-                
-                # Get source table columns
-                source_cursor.execute(f"""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = '{table_name}' 
-                    AND table_schema = 'public'
-                    ORDER BY ordinal_position
-                """)
-                source_columns = [row[0] for row in source_cursor.fetchall()]
-                
-                # Find common columns
-                common_columns = [col for col in target_schema.keys() if col in source_columns]
-                
-                if not common_columns:
-                    print(f"⚠️  No common columns found for {table_name}")
-                    continue
-                
-                # Clear target table
-                target_cursor.execute(f'DELETE FROM "{table_name}"')
-                target_conn.commit()
-                
-                # Get data from source
-                columns_str = ', '.join([f'"{col}"' for col in common_columns])
-                source_cursor.execute(f'SELECT {columns_str} FROM "{table_name}"')
-                rows = source_cursor.fetchall()
-                
-                if not rows:
-                    print(f"ℹ️  Table {table_name} is empty")
-                    continue
-                
-                # Insert with type conversion
-                placeholders = ', '.join(['%s'] * len(common_columns))
-                insert_query = f'INSERT INTO "{table_name}" ({columns_str}) VALUES ({placeholders})'
-                
-                success_count = 0
-                for row in rows:
-                    try:
-                        # Convert values based on target schema
-                        converted_row = []
-                        for i, (col_name, value) in enumerate(zip(common_columns, row)):
-                            target_type = target_schema[col_name]['type']
-                            converted_value = convert_value(table_name, col_name, value, target_type)
-                            converted_row.append(converted_value)
-                        
-                        target_cursor.execute(insert_query, converted_row)
-                        success_count += 1
-                        
-                    except Exception as e:
-                        print(f"❌ Error inserting row in {table_name}: {e}")
-                        target_conn.rollback()  # Rollback this transaction
-                        continue
-                
-                target_conn.commit()
-                print(f"✅ Transferred {success_count}/{len(rows)} rows for table: {table_name}")
-                
-            except Exception as e:
-                print(f"❌ Error processing table {table_name}: {e}")
-                target_conn.rollback()
-                continue
+        # Fetch column metadata for every table up front, one query per database
+        target_columns = fetch_columns(target_cursor)
+        source_columns_by_table = fetch_columns(source_cursor)
+        
+        # Let same-typed tables be copied server-side instead of through this client
+        fdw_ready = setup_source_fdw(target_conn, target_cursor)
+        
+        # Clear every table that will be reloaded before loading any of them, so
+        # parents aren't cleared while stale child rows still reference them
+        clear_levels = [
+            [table_name for table_name in level
+             if find_common_columns(table_name, target_columns, source_columns_by_table)]
+            for level in dependency_levels
+        ]
+        if not clear_tables(target_conn, target_cursor, clear_levels):
+            return False
+        
+        # Tables within a level don't reference each other, so they're transferred
+        # in parallel; a level starts once every table it references is loaded
+        all_transferred = True
+        max_workers = max(1, min(MAX_WORKERS, len(tables_to_transfer)))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for level in dependency_levels:
+                results = pool.map(
+                    lambda table_name: transfer_table(
+                        table_name, target_columns, source_columns_by_table, secondary_indexes, fdw_ready
+                    ),
+                    level
+                )
+                all_transferred = all(list(results)) and all_transferred
+        
+        run_checkpoint(target_conn, target_cursor)
+
+        if not all_transferred:
+            print("\n⚠️  Some tables were not fully transferred. Check logs above for details.")
+            return False
         
         print("\n🎉 Improved data transfer completed!")
         return True
@@ -154,6 +581,8 @@ def transfer_data():
         print(f"❌ Critical error: {e}")
         return False
     finally:
+        if fdw_ready:
+            teardown_source_fdw(target_conn, target_cursor)
         source_cursor.close()
         source_conn.close()
         target_cursor.close()
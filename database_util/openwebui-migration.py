@@ -7,15 +7,34 @@ Customized for your AI startup setup.
 
 import sqlite3
 import psycopg2
+from psycopg2 import sql
+import asyncio
 import traceback
 import sys
 import os
 from datetime import datetime
 
+from bulk_load import NULL_BYTE_TRANS, SESSION_TUNING, copy_rows, iter_batches_in_background, run_checkpoint
+
+# asyncpg is optional; when installed, batches are loaded with binary COPY
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+# The compiled row cleaner is optional; build it with `cythonize -i row_cleaner.pyx`
+try:
+    from row_cleaner import clean_row
+except ImportError:
+    def clean_row(row, cleaners):
+        """Apply each column's cleaner to the matching value of a SQLite row"""
+        return [clean(item) for clean, item in zip(cleaners, row)]
+
 # Configuration for Azure PostgreSQL
 SQLITE_DB_PATH = 'webui_backup.db'  # Will be downloaded from Azure
 BATCH_SIZE = 500
 MAX_RETRIES = 3
+COMMIT_EVERY_BATCHES = 100  # Intermediate commit interval within a table (~50k rows)
 
 # Azure PostgreSQL Configuration
 PG_CONFIG = {
@@ -31,19 +50,21 @@ def log_message(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {message}")
 
-def check_sqlite_integrity():
-    """Run integrity check on SQLite database"""
+def check_sqlite_integrity(deep_check=False):
+    """Run integrity check on SQLite database
+    
+    By default runs quick_check, which skips verifying index contents and
+    stops at the first problem. deep_check runs the full integrity_check.
+    """
     log_message("Running SQLite database integrity check...")
     try:
         conn = sqlite3.connect(SQLITE_DB_PATH)
         cursor = conn.cursor()
 
-        cursor.execute("PRAGMA integrity_check;")
+        check_name = "integrity_check" if deep_check else "quick_check(1)"
+        cursor.execute(f"PRAGMA {check_name};")
         result = cursor.fetchall()
 
-        cursor.execute("PRAGMA quick_check;")
-        quick_result = cursor.fetchall()
-
         cursor.execute("PRAGMA foreign_key_check;")
         fk_result = cursor.fetchall()
 
@@ -52,11 +73,6 @@ def check_sqlite_integrity():
             log_message(f"Integrity check results: {result}")
             return False
 
-        if quick_result != [('ok',)]:
-            log_message("❌ Quick check failed!")
-            log_message(f"Quick check results: {quick_result}")
-            return False
-
         if fk_result:
             log_message("❌ Foreign key check failed!")
             log_message(f"Foreign key issues: {fk_result}")
@@ -100,15 +116,87 @@ def get_sqlite_safe_identifier(identifier: str) -> str:
     """Quotes identifiers for SQLite queries"""
     return f'"{identifier}"'
 
-def get_pg_safe_identifier(identifier: str) -> str:
-    """Quotes identifiers for PostgreSQL if they're reserved words"""
-    reserved_keywords = {
-        'user', 'group', 'order', 'table', 'select', 'where', 'from', 
-        'index', 'constraint', 'function', 'procedure', 'trigger', 'view',
-        'schema', 'database', 'column', 'primary', 'foreign', 'key',
-        'references', 'unique', 'check', 'default', 'null', 'not'
-    }
-    return f'"{identifier}"' if identifier.lower() in reserved_keywords else identifier
+def _decode_bytes(item):
+    """Decode a BLOB value to text"""
+    try:
+        return item.decode('utf-8', errors='replace')
+    except:
+        return item.decode('latin1', errors='replace')
+
+def _clean_text(item):
+    """Clean a value from a TEXT-affinity column, checking for str first"""
+    if isinstance(item, str):
+        # Handle special characters and null bytes
+        return item.translate(NULL_BYTE_TRANS)
+    if isinstance(item, bytes):
+        return _decode_bytes(item)
+    return item
+
+def _clean_blob(item):
+    """Clean a value from a BLOB column, checking for bytes first"""
+    if isinstance(item, bytes):
+        return _decode_bytes(item)
+    return _clean_text(item)
+
+def _clean_number(item):
+    """Clean a value from a numeric-affinity column, passing numbers straight through"""
+    if item is None or type(item) in (int, float):
+        return item
+    return _clean_text(item)
+
+def pick_cleaner(declared_type):
+    """Pick a value cleaner from a column's declared type, following SQLite's affinity rules"""
+    declared_type = declared_type.upper()
+    if 'INT' in declared_type:
+        return _clean_number
+    if 'CHAR' in declared_type or 'CLOB' in declared_type or 'TEXT' in declared_type:
+        return _clean_text
+    if 'BLOB' in declared_type or not declared_type:
+        return _clean_blob
+    return _clean_number
+
+def connect_binary_copy():
+    """Open an asyncpg connection for binary COPY, returning (loop, conn) or (None, None)"""
+    if asyncpg is None:
+        log_message("asyncpg not installed, loading with text COPY")
+        return None, None
+
+    loop = asyncio.new_event_loop()
+    try:
+        conn = loop.run_until_complete(asyncpg.connect(**PG_CONFIG))
+        loop.run_until_complete(conn.execute(SESSION_TUNING))
+    except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+        log_message(f"⚠️  Could not open asyncpg connection, loading with text COPY: {e}")
+        loop.close()
+        return None, None
+    return loop, conn
+
+def begin_binary_transaction(loop, conn):
+    """Open a transaction on the asyncpg connection for a table's binary COPYs"""
+    transaction = conn.transaction()
+    loop.run_until_complete(transaction.start())
+    return transaction
+
+def commit_binary_transaction(loop, transaction):
+    """Commit a transaction from begin_binary_transaction, if one is open"""
+    if transaction is not None:
+        loop.run_until_complete(transaction.commit())
+
+def rollback_binary_transaction(loop, transaction):
+    """Roll back a transaction from begin_binary_transaction, if one is open"""
+    if transaction is not None:
+        loop.run_until_complete(transaction.rollback())
+
+def copy_records_binary(loop, conn, table_name, columns, rows):
+    """Bulk load rows through asyncpg's binary COPY.
+    
+    Runs in a savepoint of the open transaction, so a rejected batch
+    doesn't discard the batches loaded before it.
+    """
+    async def copy():
+        async with conn.transaction():
+            await conn.copy_records_to_table(table_name, records=rows, columns=columns, schema_name='public')
+    loop.run_until_complete(copy())
 
 def download_sqlite_db():
     """Download SQLite database from Azure server"""
@@ -139,7 +227,7 @@ def download_sqlite_db():
         log_message(f"❌ Failed to download SQLite database: {e}")
         return False
 
-def migrate():
+def migrate(deep_check=False):
     """Main migration function"""
     # Download SQLite database first
     if not os.path.exists(SQLITE_DB_PATH):
@@ -147,7 +235,7 @@ def migrate():
             log_message("Failed to download database. Exiting.")
             sys.exit(1)
     
-    if not check_sqlite_integrity():
+    if not check_sqlite_integrity(deep_check):
         log_message("Aborting migration due to database integrity issues")
         sys.exit(1)
 
@@ -155,7 +243,8 @@ def migrate():
     log_message(f"Source: SQLite database ({SQLITE_DB_PATH})")
     log_message(f"Target: PostgreSQL at {PG_CONFIG['host']}:{PG_CONFIG['port']}/{PG_CONFIG['database']}")
 
-    sqlite_conn = sqlite3.connect(SQLITE_DB_PATH, timeout=60)
+    # Rows are read on a background thread, so allow cross-thread cursor use
+    sqlite_conn = sqlite3.connect(SQLITE_DB_PATH, timeout=60, check_same_thread=False)
     sqlite_cursor = sqlite_conn.cursor()
 
     # Optimize SQLite performance
@@ -164,6 +253,11 @@ def migrate():
 
     pg_conn = psycopg2.connect(**PG_CONFIG)
     pg_cursor = pg_conn.cursor()
+    pg_cursor.execute(SESSION_TUNING)
+    pg_conn.commit()
+
+    # psycopg2 handles DDL and lookups; asyncpg, if available, does the bulk loads
+    apg_loop, apg_conn = connect_binary_copy()
 
     total_migrated_rows = 0
     total_failed_rows = 0
@@ -175,16 +269,32 @@ def migrate():
 
         log_message(f"Found {len(tables)} tables to migrate")
 
-        for (table_name,) in tables:
+        for table_index, (table_name,) in enumerate(tables):
             # Skip migration history and version tables
             if table_name.lower() in ("migratehistory", "alembic_version", "sqlite_sequence"):
                 log_message(f"⏭️  Skipping system table: {table_name}")
                 continue
 
-            pg_safe_table_name = get_pg_safe_identifier(table_name)
+            pg_table = sql.Identifier(table_name)
             sqlite_safe_table_name = get_sqlite_safe_identifier(table_name)
             log_message(f"📋 Processing table: {table_name}")
 
+            # Rows of this table known to be durable in PostgreSQL, so an aborted
+            # table can report everything else as failed
+            total_rows = None
+            committed_rows = 0
+            pending_rows = 0
+
+            # Binary COPYs share one asyncpg transaction, committed alongside pg_conn
+            binary_transaction = None
+            binary_pending_rows = 0
+
+            # Prepared statements outlive rollbacks, so the per-row insert is
+            # deallocated in the finally below; the name comes from the table's
+            # position since table names can exceed the 63-byte identifier limit
+            statement_name = sql.Identifier(f"_prep_{table_index}")
+            statement_prepared = False
+
             try:
                 # First, let OpenWebUI create the schema by trying to connect
                 log_message(f"Ensuring table {table_name} exists in PostgreSQL...")
@@ -220,15 +330,19 @@ def migrate():
                         # Create table in PostgreSQL
                         columns = []
                         for col in schema:
-                            col_name = get_pg_safe_identifier(col[1])
                             col_type = sqlite_to_pg_type(col[2])
                             nullable = "NOT NULL" if col[3] else ""
                             primary_key = "PRIMARY KEY" if col[5] else ""
                             
-                            column_def = f"{col_name} {col_type} {nullable} {primary_key}".strip()
+                            column_def = sql.SQL("{} {}").format(
+                                sql.Identifier(col[1]),
+                                sql.SQL(f"{col_type} {nullable} {primary_key}".strip())
+                            )
                             columns.append(column_def)
                         
-                        create_query = f"CREATE TABLE IF NOT EXISTS {pg_safe_table_name} ({', '.join(columns)})"
+                        create_query = sql.SQL("CREATE TABLE IF NOT EXISTS {} ({})").format(
+                            pg_table, sql.SQL(', ').join(columns)
+                        )
                         log_message(f"Creating table: {table_name}")
                         pg_cursor.execute(create_query)
                         pg_conn.commit()
@@ -251,7 +365,7 @@ def migrate():
                 # Clear existing data
                 try:
                     log_message(f"Clearing existing data from {table_name}")
-                    pg_cursor.execute(f"TRUNCATE TABLE {pg_safe_table_name} CASCADE")
+                    pg_cursor.execute(sql.SQL("TRUNCATE TABLE {} CASCADE").format(pg_table))
                     pg_conn.commit()
                 except psycopg2.Error as e:
                     log_message(f"Note: Could not truncate {table_name}: {e}")
@@ -270,70 +384,127 @@ def migrate():
 
                 log_message(f"Found {total_rows} rows to migrate")
 
-                # Process data in batches
-                while processed_rows < total_rows:
-                    try:
-                        sqlite_cursor.execute(f"""
-                            SELECT * FROM {sqlite_safe_table_name} 
-                            LIMIT {BATCH_SIZE} OFFSET {processed_rows}
-                        """)
-                        raw_rows = sqlite_cursor.fetchall()
-
-                        if not raw_rows:
-                            break
-
-                        # Clean and process each row
-                        for row_idx, raw_row in enumerate(raw_rows):
+                # Prepare load statements once per table; the insert is only sent to the
+                # server (PREPARE) the first time a batch falls back to per-row inserts
+                col_names = sql.SQL(', ').join(sql.Identifier(col[1]) for col in schema)
+                param_refs = sql.SQL(', ').join(sql.SQL(f'${i}') for i in range(1, len(schema) + 1))
+                placeholders = sql.SQL(', ').join(sql.Placeholder() * len(schema))
+                
+                copy_query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT text, NULL '\\N')").format(
+                    pg_table, col_names
+                )
+                prepare_query = sql.SQL("""
+                    PREPARE {} AS
+                    INSERT INTO {} 
+                    ({}) 
+                    VALUES ({})
+                """).format(statement_name, pg_table, col_names, param_refs)
+                insert_query = sql.SQL("EXECUTE {} ({})").format(statement_name, placeholders)
+                batch_count = 0
+
+                # Binary COPY needs Python types that match the target columns exactly;
+                # the first rejected batch switches the table over to text COPY
+                column_names = [col[1] for col in schema]
+                binary_copy = apg_conn is not None
+
+                # Resolve a cleaner per column once, from the declared SQLite type
+                cleaners = [pick_cleaner(col[2]) for col in schema]
+
+                def clean_table_row(raw_row):
+                    return clean_row(raw_row, cleaners)
+
+                # Stream rows through a single cursor rather than re-scanning with OFFSET;
+                # SQLite reads and row cleaning run on a background thread
+                sqlite_cursor.execute(f"SELECT * FROM {sqlite_safe_table_name}")
+                try:
+                    for cleaned_rows in iter_batches_in_background(
+                        lambda: sqlite_cursor.fetchmany(BATCH_SIZE), clean_table_row
+                    ):
+                        # Prefer binary COPY, which skips encoding every value as text
+                        loaded = False
+                        if binary_copy:
+                            if binary_transaction is None:
+                                binary_transaction = begin_binary_transaction(apg_loop, apg_conn)
                             try:
-                                # Clean the data
-                                cleaned_row = []
-                                for item in raw_row:
-                                    if isinstance(item, bytes):
-                                        try:
-                                            cleaned_row.append(item.decode('utf-8', errors='replace'))
-                                        except:
-                                            cleaned_row.append(item.decode('latin1', errors='replace'))
-                                    elif isinstance(item, str):
-                                        # Handle special characters and null bytes
-                                        cleaned_item = item.replace('\x00', '')
-                                        cleaned_row.append(cleaned_item)
-                                    else:
-                                        cleaned_row.append(item)
-
-                                # Prepare insert statement
-                                col_names = [get_pg_safe_identifier(col[1]) for col in schema]
-                                placeholders = ', '.join(['%s'] * len(cleaned_row))
-                                
-                                insert_query = f"""
-                                    INSERT INTO {pg_safe_table_name} 
-                                    ({', '.join(col_names)}) 
-                                    VALUES ({placeholders})
-                                """
-                                
-                                # Execute insert
-                                pg_cursor.execute(insert_query, cleaned_row)
-                                
-                            except Exception as e:
-                                error_msg = f"Row {processed_rows + row_idx}: {str(e)[:100]}"
-                                failed_rows.append(error_msg)
-                                log_message(f"❌ Error processing row in {table_name}: {error_msg}")
-                                continue
-
-                        processed_rows += len(raw_rows)
-                        pg_conn.commit()
+                                copy_records_binary(apg_loop, apg_conn, table_name, column_names, cleaned_rows)
+                                loaded = True
+                                binary_pending_rows += len(cleaned_rows)
+                            except (asyncpg.PostgresError, asyncpg.InterfaceError, TypeError, ValueError, OverflowError) as e:
+                                # The binary encoder raises TypeError and friends when a value's
+                                # Python type doesn't match the column (e.g. SQLite 0/1 booleans)
+                                log_message(f"⚠️  Binary COPY failed for {table_name}, using text COPY for this table: {e}")
+                                binary_copy = False
+
+                                # Commit the binary batches loaded so far, so text COPY on
+                                # pg_conn never waits on this transaction's uncommitted rows
+                                commit_binary_transaction(apg_loop, binary_transaction)
+                                binary_transaction = None
+                                committed_rows += binary_pending_rows
+                                binary_pending_rows = 0
+
+                        if not loaded:
+                            batch_failures = len(failed_rows)
+
+                            # Bulk load the batch with COPY; a single bad row aborts the
+                            # whole COPY, so fall back to per-row inserts to isolate it.
+                            # The savepoint keeps earlier uncommitted batches on failure
+                            pg_cursor.execute("SAVEPOINT batch_copy")
+                            try:
+                                copy_rows(pg_cursor, copy_query, cleaned_rows)
+                                pg_cursor.execute("RELEASE SAVEPOINT batch_copy")
+                            except psycopg2.Error as e:
+                                log_message(f"⚠️  COPY failed for batch in {table_name}, retrying row by row: {e}")
+                                pg_cursor.execute("ROLLBACK TO SAVEPOINT batch_copy")
+
+                                if not statement_prepared:
+                                    pg_cursor.execute(prepare_query)
+                                    statement_prepared = True
+
+                                for row_idx, cleaned_row in enumerate(cleaned_rows):
+                                    pg_cursor.execute("SAVEPOINT row_insert")
+                                    try:
+                                        pg_cursor.execute(insert_query, cleaned_row)
+                                        pg_cursor.execute("RELEASE SAVEPOINT row_insert")
+                                    except Exception as e:
+                                        pg_cursor.execute("ROLLBACK TO SAVEPOINT row_insert")
+                                        error_msg = f"Row {processed_rows + row_idx}: {str(e)[:100]}"
+                                        failed_rows.append(error_msg)
+                                        log_message(f"❌ Error processing row in {table_name}: {error_msg}")
+
+                            pending_rows += len(cleaned_rows) - (len(failed_rows) - batch_failures)
+
+                        processed_rows += len(cleaned_rows)
+                        batch_count += 1
+                        
+                        # Commit once per table, plus every COMMIT_EVERY_BATCHES batches
+                        # to bound the work lost if a large table fails partway
+                        if batch_count % COMMIT_EVERY_BATCHES == 0:
+                            pg_conn.commit()
+                            commit_binary_transaction(apg_loop, binary_transaction)
+                            binary_transaction = None
+                            committed_rows += pending_rows + binary_pending_rows
+                            pending_rows = binary_pending_rows = 0
                         
                         # Progress update
                         progress = (processed_rows / total_rows) * 100
                         log_message(f"Progress: {processed_rows}/{total_rows} rows ({progress:.1f}%)")
+                except sqlite3.DatabaseError as e:
+                    log_message(f"SQLite error during batch processing: {e}")
 
-                    except sqlite3.DatabaseError as e:
-                        log_message(f"SQLite error during batch processing: {e}")
-                        processed_rows += BATCH_SIZE
-                        continue
+                # Rows never read because SQLite stopped streaming count as failed
+                unread_rows = max(total_rows - processed_rows, 0)
+                if unread_rows:
+                    log_message(f"⚠️  {unread_rows} rows of {table_name} were not read from SQLite")
+
+                pg_conn.commit()
+                commit_binary_transaction(apg_loop, binary_transaction)
+                binary_transaction = None
+                committed_rows += pending_rows + binary_pending_rows
+                pending_rows = binary_pending_rows = 0
 
                 successful_rows = processed_rows - len(failed_rows)
                 total_migrated_rows += successful_rows
-                total_failed_rows += len(failed_rows)
+                total_failed_rows += len(failed_rows) + unread_rows
 
                 log_message(f"✅ Completed table {table_name}: {successful_rows}/{total_rows} rows migrated")
                 
@@ -347,8 +518,37 @@ def migrate():
             except Exception as e:
                 log_message(f"❌ Critical error processing table {table_name}: {e}")
                 traceback.print_exc()
+                pg_conn.rollback()
+                try:
+                    rollback_binary_transaction(apg_loop, binary_transaction)
+                except (asyncpg.PostgresError, asyncpg.InterfaceError) as rollback_error:
+                    log_message(f"⚠️  Could not roll back binary COPY for {table_name}: {rollback_error}")
+
+                # Only committed rows survive the rollback; the rest of the table is lost
+                if total_rows is None:
+                    try:
+                        sqlite_cursor.execute(f"SELECT COUNT(*) FROM {sqlite_safe_table_name}")
+                        total_rows = sqlite_cursor.fetchone()[0]
+                    except sqlite3.DatabaseError:
+                        # Row count unknown; still make sure the table counts as failed
+                        total_rows = committed_rows + 1
+                lost_rows = max(total_rows - committed_rows, 0)
+                total_migrated_rows += committed_rows
+                total_failed_rows += lost_rows
+                log_message(f"⚠️  Table {table_name} aborted: {lost_rows}/{total_rows} rows not migrated")
                 continue
 
+            finally:
+                if statement_prepared:
+                    try:
+                        pg_cursor.execute(sql.SQL("DEALLOCATE {}").format(statement_name))
+                        pg_conn.commit()
+                    except psycopg2.Error as e:
+                        log_message(f"⚠️  Could not deallocate insert statement for {table_name}: {e}")
+                        pg_conn.rollback()
+
+        run_checkpoint(pg_conn, pg_cursor, log=log_message)
+
         # Final summary
         log_message("\n" + "="*60)
         log_message("🎉 MIGRATION COMPLETED!")
@@ -378,6 +578,9 @@ def migrate():
             pg_cursor.close()
         if 'pg_conn' in locals():
             pg_conn.close()
+        if apg_conn is not None:
+            apg_loop.run_until_complete(apg_conn.close())
+            apg_loop.close()
         
         log_message("🔌 Database connections closed")
 
@@ -387,7 +590,8 @@ if __name__ == "__main__":
     log_message("="*60)
     
     try:
-        success = migrate()
+        # Pass --deep-check to run SQLite's full integrity_check before migrating
+        success = migrate(deep_check='--deep-check' in sys.argv[1:])
         if success:
             log_message("🎉 Migration completed successfully!")
             log_message("Next steps:")
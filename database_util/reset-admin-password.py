@@ -15,6 +15,7 @@ PG_CONFIG = {
     'user': 'litellm_user',
     'password': 'litellm_password'
 }
+BCRYPT_ROUNDS = 12  # bcrypt cost factor; each step down halves hashing time
 
 def reset_admin_password():
     print("🔑 Resetting OpenWebUI Admin Password...")
@@ -25,7 +26,7 @@ def reset_admin_password():
     
     try:
         # Generate bcrypt hash for new password
-        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
         print(f"✅ Generated new password hash")
         
         # Connect to database
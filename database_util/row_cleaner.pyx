@@ -0,0 +1,15 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled per-row cleaning loop for openwebui-migration.py
+
+Build in place with:  cythonize -i row_cleaner.pyx
+"""
+
+cpdef list clean_row(tuple row, list cleaners):
+    """Apply each column's cleaner to the matching value of a SQLite row"""
+    cdef Py_ssize_t i
+    cdef Py_ssize_t n = len(cleaners)
+    cdef list cleaned = [None] * n
+    for i in range(n):
+        cleaned[i] = cleaners[i](row[i])
+    return cleaned